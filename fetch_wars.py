@@ -1,11 +1,16 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils import get_column_letter
 import os
+import shutil
 from config import API_KEY, CLAN_TAG
 
 # Try to import Discord webhook URL (optional)
@@ -14,6 +19,19 @@ try:
 except ImportError:
     DISCORD_WEBHOOK_URL = None
 
+# Parquet war store files need pyarrow (optional); without it each war is stored as a small Excel file
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# orjson is a faster JSON serializer (optional); without it the standard json module is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # API Configuration
 BASE_URL = "https://api.clashofclans.com/v1"
 HEADERS = {
@@ -21,10 +39,30 @@ HEADERS = {
     "Accept": "application/json"
 }
 
+# Shared by the Clash API and Discord so connections are pooled and kept alive.
+# Auth stays in HEADERS, sent per request, so the API key never goes to Discord.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
 EXCEL_FILE = 'clash_wars.xlsx'
 LEADERBOARD_FILE = 'leaderboard.json'
 ROSTER_SHEET_NAME = 'ROSTER'
 MISSED_HITS_SHEET_NAME = 'MISSED_HITS'
+WARS_DIR = 'wars'
+WORKBOOK_MTIME_FILE = os.path.join(WARS_DIR, '.workbook_mtime')
+STORE_READ_WORKERS = 4
+API_TIME_FORMAT = '%Y%m%dT%H%M%S.%f%z'
+# Stored as booleans in memory and Parquet, written as Yes/No in Excel
+FLAG_COLUMNS = ['War Complete', 'Is Triple', 'Is Missed', 'Is Loot Hit']
+# Loot hits are marked by hand in Excel, so any of these spellings counts as a Yes
+TRUE_VALUES = ['TRUE', True, 'Yes', 'yes', 1]
+LEADERBOARD_COLUMNS = [
+    'War ID', 'War End Time', 'War Complete', 'Player Name', 'Player Tag', 'Town Hall',
+    'Attack Number', 'Stars', 'Destruction %', 'Is Triple', 'Is Missed', 'Is Loot Hit'
+]
+ETAG_FILE = 'etag.json'
+WARS_INDEX_FILE = 'wars_index.json'
+LAST_WAR_FILE = 'last_war.json'
 
 def format_tag(tag):
     """Ensure tag starts with #"""
@@ -32,14 +70,70 @@ def format_tag(tag):
         return '#' + tag
     return tag
 
+def load_war_validators():
+    """Load the ETag/Last-Modified headers saved with the cached war response"""
+    if not os.path.exists(ETAG_FILE) or not os.path.exists(LAST_WAR_FILE):
+        return {}
+    
+    try:
+        with open(ETAG_FILE) as f:
+            return json.load(f).get(format_tag(CLAN_TAG), {})
+    except (OSError, ValueError):
+        return {}
+
+def write_file(filename, content):
+    """Write bytes through a temp file and rename it into place, so a crash never leaves a partial file"""
+    tmp_filename = f'{filename}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
+
+def write_json(filename, data):
+    """Write data as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        write_file(filename, orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        return
+    
+    write_file(filename, json.dumps(data, indent=2).encode())
+
 def fetch_current_war():
-    """Fetch current war details"""
+    """Fetch current war details, reusing the cached response if unchanged"""
     clan_tag = format_tag(CLAN_TAG).replace('#', '%23')
     url = f"{BASE_URL}/clans/{clan_tag}/currentwar"
     
+    validators = load_war_validators()
+    headers = dict(HEADERS)
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = SESSION.get(url, headers=headers)
+        
+        if response.status_code == 304:
+            try:
+                with open(LAST_WAR_FILE) as f:
+                    war = json.load(f)
+                print("War unchanged since last fetch - using cached response")
+                return war
+            except (OSError, ValueError) as e:
+                print(f"Cached war response is unreadable, fetching it again: {e}")
+                response = SESSION.get(url, headers=HEADERS)
+        
         response.raise_for_status()
+        
+        # The body is replaced before its validators, so a crash in between only costs a full refetch
+        write_file(LAST_WAR_FILE, response.content)
+        
+        # Only the configured clan is cached, so last_war.json always matches these headers
+        write_json(ETAG_FILE, {
+            format_tag(CLAN_TAG): {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+        })
+        
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching current war: {e}")
@@ -61,21 +155,38 @@ def is_cwl_war(war):
     war_league = war.get('warLeague', {})
     return war_league.get('name') != 'Unranked' if war_league else False
 
+def worksheet_to_dataframe(ws):
+    """Stream a read-only worksheet into a DataFrame using the first row as header"""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    return pd.DataFrame(list(rows), columns=header)
+
 def war_already_saved(war_id):
-    """Check if war is already saved in Excel and if it's complete"""
+    """Check if war is already saved and if it's complete"""
+    # The index is rewritten with every save, so it answers even when the workbook is missing
+    index = load_wars_index()
+    if index is not None:
+        entry = index.get(war_id[:31])
+        return entry is not None, bool(entry and entry.get('complete'))
+    
     if not os.path.exists(EXCEL_FILE):
         return False, False
     
     try:
-        book = load_workbook(EXCEL_FILE, read_only=True)
+        book = load_workbook(EXCEL_FILE, read_only=True, data_only=True)
         sheet_name = war_id[:31]
         exists = sheet_name in book.sheetnames
         
+        # Only the header and first data row are needed, so stop streaming there
         is_complete = False
         if exists:
-            df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
-            if not df.empty and 'War Complete' in df.columns:
-                is_complete = df['War Complete'].iloc[0] == 'Yes'
+            rows = book[sheet_name].iter_rows(values_only=True)
+            header = next(rows, None)
+            first = next(rows, None)
+            if header and first and 'War Complete' in header:
+                is_complete = first[header.index('War Complete')] in TRUE_VALUES
         
         book.close()
         return exists, is_complete
@@ -83,35 +194,55 @@ def war_already_saved(war_id):
         print(f"Error checking existing wars: {e}")
         return False, False
 
-def get_existing_loot_hits(war_id):
+def get_existing_loot_hits(war_id, war_sheets=None):
     """Get existing loot hit markings for a war if it exists"""
+    sheet_name = war_id[:31]
+    
+    # Loaded wars already carry markings synced from the workbook, so Excel is only read for wars not loaded
+    if war_sheets is not None and sheet_name in war_sheets:
+        df = war_sheets[sheet_name]
+        if 'Is Loot Hit' not in df.columns:
+            return {}
+        return df[df['Is Loot Hit']].groupby('Player Tag')['Attack Number'].agg(list).to_dict()
+    
     if not os.path.exists(EXCEL_FILE):
         return {}
     
     try:
-        sheet_name = war_id[:31]
-        df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
+        book = load_workbook(EXCEL_FILE, read_only=True, data_only=True)
+    except Exception as e:
+        return {}
+    
+    # One streamed pass over the sheet's tuples; no DataFrame is needed for a small dict
+    try:
+        rows = book[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header or 'Is Loot Hit' not in header:
+            return {}
+        
+        tag_idx = header.index('Player Tag')
+        loot_idx = header.index('Is Loot Hit')
+        attack_idx = header.index('Attack Number') if 'Attack Number' in header else None
         
         loot_hits = {}
-        for idx, row in df.iterrows():
-            player_tag = row['Player Tag']
-            if 'Is Loot Hit' in row and row['Is Loot Hit'] in ['TRUE', True, 'Yes', 'yes', 1]:
-                attack_num = row.get('Attack Number', 0)
-                if player_tag not in loot_hits:
-                    loot_hits[player_tag] = []
-                loot_hits[player_tag].append(attack_num)
+        for row in rows:
+            if row[loot_idx] in TRUE_VALUES:
+                attack_num = row[attack_idx] if attack_idx is not None else 0
+                loot_hits.setdefault(row[tag_idx], []).append(attack_num)
         
         return loot_hits
     except Exception as e:
         return {}
+    finally:
+        book.close()
 
-def process_war(war, preserve_loot_markings=True):
+def process_war(war, preserve_loot_markings=True, war_sheets=None):
     """Process war data and extract player statistics"""
     if not war:
         return None
     
     war_id = get_war_id(war)
-    existing_loot = get_existing_loot_hits(war_id) if preserve_loot_markings else {}
+    existing_loot = get_existing_loot_hits(war_id, war_sheets) if preserve_loot_markings else {}
     
     war_state = war.get('state', 'unknown')
     end_time = war.get('endTime', 'N/A')
@@ -122,52 +253,69 @@ def process_war(war, preserve_loot_markings=True):
     clan = war.get('clan', {})
     members = clan.get('members', [])
     
-    war_details = []
+    # One row per member per expected attack, in roster order
+    roster = pd.DataFrame({
+        'Player Name': [member.get('name', '') for member in members],
+        'Player Tag': [member.get('tag', '') for member in members],
+        'Town Hall': [member.get('townhallLevel', 0) for member in members],
+        'Map Position': [member.get('mapPosition', 0) for member in members]
+    })
+    expected = pd.DataFrame({'Attack Number': range(1, attacks_per_member + 1)})
+    war_details = roster.merge(expected, how='cross')
+    
+    # Flatten actual attacks; attacks without an order fall back to their position
+    attacks = pd.json_normalize(
+        [member for member in members if member.get('attacks')],
+        record_path='attacks', meta=['tag'], meta_prefix='member_', errors='ignore'
+    ).reindex(columns=['member_tag', 'order', 'stars', 'destructionPercentage'])
+    position = attacks.groupby('member_tag', dropna=False).cumcount() + 1
+    attacks['Attack Number'] = attacks['order'].fillna(position).astype(int)
+    attacks = attacks.drop_duplicates(['member_tag', 'Attack Number'], keep='last')
+    attacks = attacks.rename(columns={
+        'member_tag': 'Player Tag',
+        'stars': 'Stars',
+        'destructionPercentage': 'Destruction %'
+    })
+    
+    war_details = war_details.merge(
+        attacks[['Player Tag', 'Attack Number', 'Stars', 'Destruction %']],
+        on=['Player Tag', 'Attack Number'],
+        how='left'
+    )
     
-    for member in members:
-        player_tag = member.get('tag', '')
-        player_name = member.get('name', '')
-        th_level = member.get('townhallLevel', 0)
-        map_position = member.get('mapPosition', 0)
-        
-        attacks = member.get('attacks', [])
-        attacks_dict = {attack.get('order', i+1): attack for i, attack in enumerate(attacks)}
-        
-        # Pre-populate expected attacks
-        for attack_num in range(1, attacks_per_member + 1):
-            if attack_num in attacks_dict:
-                # Actual attack exists
-                attack = attacks_dict[attack_num]
-                stars = attack.get('stars', 0)
-                destruction = attack.get('destructionPercentage', 0)
-                is_missed = (stars == 0 and destruction == 0)
-            else:
-                # Attack was missed
-                stars = 0
-                destruction = 0
-                is_missed = True
-            
-            is_loot = False
-            if player_tag in existing_loot and attack_num in existing_loot[player_tag]:
-                is_loot = True
-            
-            war_details.append({
-                'War ID': war_id,
-                'War State': war_state,
-                'War Complete': 'Yes' if is_complete else 'No',
-                'War End Time': end_time,
-                'Team Size': team_size,
-                'Player Name': player_name,
-                'Player Tag': player_tag,
-                'Town Hall': th_level,
-                'Map Position': map_position,
-                'Attack Number': attack_num,
-                'Stars': stars,
-                'Destruction %': destruction,
-                'Is Triple': 'Yes' if stars == 3 else 'No',
-                'Is Missed': 'Yes' if is_missed else 'No',
-                'Is Loot Hit': 'Yes' if is_loot else 'No'
-            })
+    # Attacks that never happened count as 0 stars / 0%, which also marks them missed
+    war_details['Stars'] = war_details['Stars'].fillna(0).astype(int)
+    war_details['Destruction %'] = war_details['Destruction %'].fillna(0)
+    if (war_details['Destruction %'] % 1 == 0).all():
+        war_details['Destruction %'] = war_details['Destruction %'].astype(int)
+    
+    is_missed = (war_details['Stars'] == 0) & (war_details['Destruction %'] == 0)
+    
+    is_loot = np.zeros(len(war_details), dtype=bool)
+    if existing_loot:
+        loot_keys = pd.MultiIndex.from_tuples(
+            [(tag, attack_num) for tag, attack_nums in existing_loot.items() for attack_num in attack_nums]
+        )
+        is_loot = pd.MultiIndex.from_frame(war_details[['Player Tag', 'Attack Number']]).isin(loot_keys)
+    
+    # Build the final frame in one constructor, column by column, in sheet order
+    war_details = pd.DataFrame({
+        'War ID': war_id,
+        'War State': war_state,
+        'War Complete': is_complete,
+        'War End Time': end_time,
+        'Team Size': team_size,
+        'Player Name': war_details['Player Name'],
+        'Player Tag': war_details['Player Tag'],
+        'Town Hall': war_details['Town Hall'],
+        'Map Position': war_details['Map Position'],
+        'Attack Number': war_details['Attack Number'],
+        'Stars': war_details['Stars'],
+        'Destruction %': war_details['Destruction %'],
+        'Is Triple': war_details['Stars'] == 3,
+        'Is Missed': is_missed,
+        'Is Loot Hit': is_loot
+    }, index=war_details.index)
     
     return {
         'war_id': war_id,
@@ -175,252 +323,428 @@ def process_war(war, preserve_loot_markings=True):
         'is_ended': is_complete
     }
 
-def save_war_to_excel(war_data):
-    """Save war data to Excel with separate sheet for each war"""
-    if not war_data or not war_data['war_details']:
+def save_war_to_excel(war_data, war_sheets):
+    """Save war data to the war store, republishing the Excel workbook when needed"""
+    if not war_data or war_data['war_details'].empty:
         print("No war data to save")
         return False
     
     war_id = war_data['war_id']
-    df = pd.DataFrame(war_data['war_details'])
-    
-    if os.path.exists(EXCEL_FILE):
-        book = load_workbook(EXCEL_FILE)
-    else:
-        book = Workbook()
-        if 'Sheet' in book.sheetnames:
-            del book['Sheet']
+    df = war_data['war_details']
     
     sheet_name = war_id[:31]
+    is_new = sheet_name not in war_sheets
     
-    if sheet_name in book.sheetnames:
-        del book[sheet_name]
-        print(f"Updating existing war {sheet_name}...")
-    else:
+    # Updated wars move to the end, matching a delete + re-create of the sheet
+    if is_new:
         print(f"Creating new war {sheet_name}...")
+    else:
+        del war_sheets[sheet_name]
+        print(f"Updating existing war {sheet_name}...")
     
-    ws = book.create_sheet(sheet_name)
+    war_sheets[sheet_name] = df
+    stored = save_war_store(war_sheets, sheet_name)
     
-    for r_idx, r in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        ws.append(r)
-        
-        if r_idx == 1:
-            for cell in ws[r_idx]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for column in ws.columns:
-        max_length = 0
-        column = list(column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column[0].column_letter].width = adjusted_width
+    # In-progress updates only touch the war's own store file; the full workbook
+    # is rebuilt when a war first appears, when it ends, if it is missing, or if
+    # the store could not be written so the update still lands somewhere
+    if is_new or war_data['is_ended'] or not stored or not os.path.exists(EXCEL_FILE):
+        publish_workbook(war_sheets)
+    else:
+        print(f"✓ Saved war to {war_store_file(sheet_name)} (Excel is republished when the war ends)")
     
-    book.save(EXCEL_FILE)
+    save_wars_index(war_sheets)
+    return True
+
+def publish_workbook(war_sheets):
+    """Rebuild the Excel workbook with the roster, missed hits and every war"""
+    # Roster and missed hits are derived from the war sheets, so rebuild them in the same write
+    roster_df = build_roster(war_sheets)
+    missed_df = build_missed_hits(war_sheets)
+    
+    write_workbook(war_sheets, roster_df, missed_df)
+    record_workbook_mtime()
     print(f"✓ Saved war to Excel")
+    print(f"✓ Updated roster sheet with {len(roster_df)} players")
+    if missed_df is not None:
+        print(f"✓ Updated missed hits sheet with {len(missed_df)} missed attacks")
+
+def load_wars_index():
+    """Load the wars index, or None if it is missing or unreadable"""
+    if not os.path.exists(WARS_INDEX_FILE):
+        return None
+    
+    try:
+        with open(WARS_INDEX_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading wars index: {e}")
+        return None
+
+def save_wars_index(war_sheets):
+    """Record each saved war's completion state and end time in a small JSON index"""
+    index = {}
+    
+    for sheet_name, df in war_sheets.items():
+        has_rows = not df.empty
+        index[sheet_name] = {
+            'complete': bool(df['War Complete'].iat[0]) if has_rows and 'War Complete' in df.columns else False,
+            'end_time': str(df['War End Time'].iat[0]) if has_rows and 'War End Time' in df.columns else None
+        }
+    
+    write_json(WARS_INDEX_FILE, index)
+
+def derive_is_missed(df):
+    """Flag recorded attacks with no stars and no destruction as missed"""
+    def column(name):
+        return df[name].fillna(0) if name in df.columns else 0
+    
+    return np.asarray((column('Stars') == 0) & (column('Destruction %') == 0) & (column('Attack Number') > 0))
+
+def parse_flags(df):
+    """Convert Yes/No flag columns read from Excel to booleans"""
+    for column in FLAG_COLUMNS:
+        if column in df.columns and df[column].dtype != bool:
+            df[column] = df[column].isin(TRUE_VALUES)
+    return df
+
+def format_flags(df):
+    """Convert boolean flag columns back to Yes/No for Excel"""
+    flags = [column for column in FLAG_COLUMNS if column in df.columns and df[column].dtype == bool]
+    if not flags:
+        return df
+    return df.assign(**{column: np.where(df[column], 'Yes', 'No') for column in flags})
+
+def war_store_file(sheet_name):
+    """Path of a war's store file: Parquet when available, otherwise a one-sheet workbook"""
+    extension = '.parquet' if PARQUET_AVAILABLE else '.xlsx'
+    return os.path.join(WARS_DIR, f'{sheet_name}{extension}')
+
+def write_war_file(path, sheet_name, df):
+    """Write a single war to a store file through a temp file, so an interrupted write never corrupts it"""
+    tmp_path = f'{path}.tmp'
+    
+    if path.endswith('.parquet'):
+        # Parquet needs one type per column, so columns mixing types (e.g. hand-typed cells) are stored as text
+        mixed = {
+            column: df[column].astype(str).where(df[column].notna(), None)
+            for column in df.columns
+            if df[column].dtype == object and df[column].dropna().map(type).nunique() > 1
+        }
+        df.assign(**mixed).to_parquet(tmp_path, index=False)
+    else:
+        book = Workbook(write_only=True)
+        write_sheet(book, sheet_name, format_flags(df), "4F81BD")
+        book.save(tmp_path)
+    
+    os.replace(tmp_path, path)
+
+def read_war_file(path):
+    """Read a single war from a store file"""
+    if path.endswith('.parquet'):
+        return parse_flags(pd.read_parquet(path))
+    
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return parse_flags(worksheet_to_dataframe(book.worksheets[0]))
+    finally:
+        book.close()
+
+def load_war_store():
+    """Load every war from the store, keyed by sheet name, or None if any war can't be read"""
+    readable = ['.parquet', '.xlsx'] if PARQUET_AVAILABLE else ['.xlsx']
+    war_files = {}
+    parquet_only = set()
+    
+    # Sorted names put a war's .parquet before its .xlsx, so Parquet wins if both exist
+    for filename in sorted(os.listdir(WARS_DIR)):
+        sheet_name, extension = os.path.splitext(filename)
+        if extension in readable and sheet_name not in war_files:
+            war_files[sheet_name] = filename
+        elif extension == '.parquet':
+            parquet_only.add(sheet_name)
+    
+    # A war left out here would be dropped from the next workbook and index, so a partial store is never used
+    parquet_only -= set(war_files)
+    if parquet_only:
+        print(f"Error: {len(parquet_only)} wars are stored as Parquet but pyarrow is not installed")
+        return None
+    
+    def read(filename):
+        try:
+            return read_war_file(os.path.join(WARS_DIR, filename))
+        except Exception as e:
+            print(f"Error reading war store file {filename}: {e}")
+            return None
+    
+    # Each war is its own file, so reads are independent and overlap well in threads
+    with ThreadPoolExecutor(max_workers=STORE_READ_WORKERS) as executor:
+        frames = list(executor.map(read, war_files.values()))
+    
+    if any(df is None for df in frames):
+        return None
+    return dict(zip(war_files, frames))
+
+def save_war_store(war_sheets, sheet_name):
+    """Write a war to the store, migrating all wars on first use; returns whether it was stored"""
+    if os.path.isdir(WARS_DIR):
+        path = war_store_file(sheet_name)
+        try:
+            write_war_file(path, sheet_name, war_sheets[sheet_name])
+            
+            # Drop a copy in the other format so it can never shadow this one
+            for extension in ('.parquet', '.xlsx'):
+                other = os.path.splitext(path)[0] + extension
+                if other != path and os.path.exists(other):
+                    os.remove(other)
+        except Exception as e:
+            print(f"Error saving war {sheet_name} to the war store: {e}")
+            return False
+        return True
+    
+    # Build the store in a temp dir so a failed migration never leaves a partial store behind
+    tmp_dir = f'{WARS_DIR}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    try:
+        for name, df in war_sheets.items():
+            write_war_file(os.path.join(tmp_dir, os.path.basename(war_store_file(name))), name, df)
+    except Exception as e:
+        print(f"Error migrating war data to the war store: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    
+    os.replace(tmp_dir, WARS_DIR)
+    print(f"✓ Migrated {len(war_sheets)} wars to the war store")
     return True
 
-def update_missed_hits_sheet():
-    """Create/update a sheet tracking missed attacks"""
+def record_workbook_mtime():
+    """Remember the workbook's mtime so later hand edits can be detected"""
+    if os.path.isdir(WARS_DIR) and os.path.exists(EXCEL_FILE):
+        with open(WORKBOOK_MTIME_FILE, 'w') as f:
+            f.write(str(os.path.getmtime(EXCEL_FILE)))
+
+def sync_loot_markings(war_sheets):
+    """Pull loot hit markings edited by hand in the workbook back into the war store"""
     if not os.path.exists(EXCEL_FILE):
-        print("No war data file found")
         return
     
-    book = load_workbook(EXCEL_FILE)
-    all_missed = []
-    
-    for sheet_name in book.sheetnames:
-        if sheet_name in [ROSTER_SHEET_NAME, MISSED_HITS_SHEET_NAME]:
+    # A workbook mtime that no longer matches the recorded one means it was edited by hand since
+    try:
+        with open(WORKBOOK_MTIME_FILE) as f:
+            if float(f.read()) == os.path.getmtime(EXCEL_FILE):
+                return
+    except (OSError, ValueError):
+        pass
+    
+    book = load_workbook(EXCEL_FILE, read_only=True, data_only=True)
+    changed = 0
+    synced = 0
+    
+    for sheet_name, df in war_sheets.items():
+        if sheet_name not in book.sheetnames:
             continue
         
         try:
-            df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
-            
-            if df['War Complete'].iloc[0] != 'Yes':
-                continue
+            sheet_df = worksheet_to_dataframe(book[sheet_name])
+            marked = sheet_df.loc[sheet_df['Is Loot Hit'].isin(TRUE_VALUES), ['Player Tag', 'Attack Number']]
+            keys = pd.MultiIndex.from_frame(df[['Player Tag', 'Attack Number']])
+            is_loot = keys.isin(pd.MultiIndex.from_frame(marked))
             
-            if 'Is Missed' not in df.columns:
-                df['Is Missed'] = df.apply(
-                    lambda row: 'Yes' if (row.get('Stars', 0) == 0 and row.get('Destruction %', 0) == 0 and row.get('Attack Number', 0) > 0) else 'No',
-                    axis=1
-                )
-            
-            missed_df = df[df['Is Missed'] == 'Yes'].copy()
-            
-            if not missed_df.empty:
-                missed_df = missed_df[['War ID', 'War End Time', 'Player Name', 'Player Tag', 
-                                      'Town Hall', 'Attack Number', 'Stars', 'Destruction %']]
-                all_missed.append(missed_df)
-        
+            if (is_loot != df['Is Loot Hit'].to_numpy()).any():
+                war_sheets[sheet_name] = df.assign(**{'Is Loot Hit': is_loot})
+                changed += 1
+                if save_war_store(war_sheets, sheet_name):
+                    synced += 1
         except Exception as e:
-            print(f"Error reading sheet {sheet_name} for missed hits: {e}")
+            print(f"Error syncing loot hits from sheet {sheet_name}: {e}")
             continue
     
-    if not all_missed:
-        print("No missed hits found")
-        return
-    
-    missed_df = pd.concat(all_missed, ignore_index=True)
-    missed_df = missed_df.sort_values(['War End Time', 'Player Name'], ascending=[False, True])
-    
-    if MISSED_HITS_SHEET_NAME in book.sheetnames:
-        del book[MISSED_HITS_SHEET_NAME]
-    
-    ws = book.create_sheet(MISSED_HITS_SHEET_NAME, 1)
+    book.close()
     
-    for r_idx, r in enumerate(dataframe_to_rows(missed_df, index=False, header=True), 1):
-        ws.append(r)
-        
-        if r_idx == 1:
-            for cell in ws[r_idx]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="DC3545", end_color="DC3545", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for column in ws.columns:
-        max_length = 0
-        column = list(column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column[0].column_letter].width = adjusted_width
+    # A war that could not be stored keeps the old mtime, so its markings are synced again next run
+    if synced == changed:
+        record_workbook_mtime()
     
-    book.save(EXCEL_FILE)
-    print(f"✓ Updated missed hits sheet with {len(missed_df)} missed attacks")
+    if synced:
+        print(f"✓ Synced loot hit markings for {synced} wars from Excel")
 
-def update_roster_sheet():
-    """Create/update a master roster sheet with all players"""
+def load_all_war_sheets():
+    """Load every war in a single pass, keyed by sheet name, or None if any war can't be read"""
+    if os.path.isdir(WARS_DIR):
+        war_sheets = load_war_store()
+        if war_sheets is not None:
+            sync_loot_markings(war_sheets)
+        return war_sheets
+    
     if not os.path.exists(EXCEL_FILE):
-        print("No war data file found")
-        return
+        return {}
     
-    book = load_workbook(EXCEL_FILE)
-    all_players = {}
+    book = load_workbook(EXCEL_FILE, read_only=True, data_only=True)
+    war_sheets = {}
     
     for sheet_name in book.sheetnames:
         if sheet_name in [ROSTER_SHEET_NAME, MISSED_HITS_SHEET_NAME]:
             continue
         
         try:
-            df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
-            
-            for _, row in df.iterrows():
-                player_tag = row['Player Tag']
-                if player_tag not in all_players:
-                    all_players[player_tag] = {
-                        'Player Tag': player_tag,
-                        'Player Name': row['Player Name'],
-                        'Last Seen TH': row.get('Town Hall', 0),
-                        'Total Wars': 0,
-                        'Wars Participated': 0
-                    }
-                
-                if row.get('Attack Number', 0) > 0:
-                    all_players[player_tag]['Wars Participated'] += 1
-                
-                current_th = row.get('Town Hall', 0)
-                if current_th > all_players[player_tag]['Last Seen TH']:
-                    all_players[player_tag]['Last Seen TH'] = current_th
+            df = worksheet_to_dataframe(book[sheet_name])
+            if df.columns.empty:
+                continue
+            war_sheets[sheet_name] = parse_flags(df)
         except Exception as e:
             print(f"Error reading sheet {sheet_name}: {e}")
-            continue
+            book.close()
+            return None
     
-    total_wars = len([s for s in book.sheetnames if s not in [ROSTER_SHEET_NAME, MISSED_HITS_SHEET_NAME]])
+    book.close()
+    return war_sheets
+
+def apply_widths(ws, df):
+    """Size each column to its longest value or header, capped at 50 characters"""
+    header_lengths = np.array([len(str(column)) for column in df.columns], dtype=int)
     
-    for player in all_players.values():
-        player['Total Wars'] = total_wars
+    if df.empty:
+        value_lengths = np.zeros(len(df.columns), dtype=int)
+    else:
+        value_lengths = df.astype(str).apply(lambda s: s.str.len().max()).fillna(0).to_numpy(dtype=int)
     
-    roster_df = pd.DataFrame(list(all_players.values()))
-    roster_df = roster_df.sort_values('Player Name')
+    widths = np.minimum(np.maximum(value_lengths, header_lengths) + 2, 50)
+    for col_idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = int(width)
+
+def write_sheet(book, sheet_name, df, header_color):
+    """Stream a DataFrame into a new sheet of a write-only workbook"""
+    ws = book.create_sheet(sheet_name)
     
-    if ROSTER_SHEET_NAME in book.sheetnames:
-        del book[ROSTER_SHEET_NAME]
+    # Column widths must be set before any rows are streamed
+    apply_widths(ws, df)
+    
+    header = []
+    for column in df.columns:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        header.append(cell)
+    ws.append(header)
+    
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        ws.append(row)
+
+def write_workbook(war_sheets, roster_df, missed_df=None):
+    """Rebuild the Excel file from scratch: roster, missed hits, then one sheet per war"""
+    book = Workbook(write_only=True)
     
-    ws = book.create_sheet(ROSTER_SHEET_NAME, 0)
+    write_sheet(book, ROSTER_SHEET_NAME, roster_df, "2E75B5")
+    if missed_df is not None:
+        write_sheet(book, MISSED_HITS_SHEET_NAME, missed_df, "DC3545")
     
-    for r_idx, r in enumerate(dataframe_to_rows(roster_df, index=False, header=True), 1):
-        ws.append(r)
-        
-        if r_idx == 1:
-            for cell in ws[r_idx]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="2E75B5", end_color="2E75B5", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for column in ws.columns:
-        max_length = 0
-        column = list(column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column[0].column_letter].width = adjusted_width
+    for sheet_name, df in war_sheets.items():
+        write_sheet(book, sheet_name, format_flags(df), "4F81BD")
     
     book.save(EXCEL_FILE)
-    print(f"✓ Updated roster sheet with {len(all_players)} players")
 
-def calculate_leaderboard(days_filter=None):
-    """Calculate leaderboard statistics from completed wars"""
-    if not os.path.exists(EXCEL_FILE):
-        print("No war data found")
+def build_missed_hits(war_sheets):
+    """Build the sheet tracking missed attacks in completed wars"""
+    all_missed = []
+    
+    for sheet_name, df in war_sheets.items():
+        try:
+            if not df['War Complete'].iat[0]:
+                continue
+            
+            if 'Is Missed' not in df.columns:
+                df = df.copy()
+                df['Is Missed'] = derive_is_missed(df)
+            
+            missed_df = df[df['Is Missed']].copy()
+            
+            if not missed_df.empty:
+                missed_df = missed_df[['War ID', 'War End Time', 'Player Name', 'Player Tag', 
+                                      'Town Hall', 'Attack Number', 'Stars', 'Destruction %']]
+                all_missed.append(missed_df)
+        
+        except Exception as e:
+            print(f"Error reading sheet {sheet_name} for missed hits: {e}")
+            continue
+    
+    if not all_missed:
+        print("No missed hits found")
         return None
     
-    book = load_workbook(EXCEL_FILE, read_only=True)
-    all_data = []
+    missed_df = pd.concat(all_missed, ignore_index=True)
+    missed_df = missed_df.sort_values(['War End Time', 'Player Name'], ascending=[False, True])
     
-    cutoff_date = None
-    if days_filter:
-        from datetime import timedelta, timezone
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_filter)
+    return missed_df
+
+def build_roster(war_sheets):
+    """Build the master roster sheet with all players"""
+    frames = {}
+    for sheet_name, df in war_sheets.items():
+        if 'Is Missed' not in df.columns:
+            df = df.assign(**{'Is Missed': derive_is_missed(df)})
+        frames[sheet_name] = df.reindex(columns=['Player Tag', 'Player Name', 'Town Hall', 'Attack Number', 'Is Missed'])
+    all_df = pd.concat(frames, names=['War', 'Row']).reset_index('War')
+    
+    # Every lineup member has a row per expected attack, so only attacks actually made count as participation
+    attacked = (all_df['Attack Number'].fillna(0) > 0) & ~all_df['Is Missed'].fillna(False).astype(bool)
+    wars_participated = attacked.groupby([all_df['Player Tag'], all_df['War']]).any().groupby(level=0).sum()
+    
+    roster_df = all_df.groupby('Player Tag', sort=False).agg(**{
+        'Player Name': ('Player Name', 'first'),
+        'Last Seen TH': ('Town Hall', 'max')
+    })
+    roster_df['Total Wars'] = len(war_sheets)
+    roster_df['Wars Participated'] = wars_participated.reindex(roster_df.index, fill_value=0)
+    
+    roster_df = roster_df.reset_index().sort_values('Player Name')
+    
+    return roster_df
+
+def combine_completed_wars(war_sheets):
+    """Combine completed wars into one DataFrame holding only the leaderboard columns"""
+    completed = []
     
-    for sheet_name in book.sheetnames:
-        if sheet_name in [ROSTER_SHEET_NAME, MISSED_HITS_SHEET_NAME]:
-            continue
-        
+    for sheet_name, df in war_sheets.items():
         try:
-            df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name)
-            
-            if df['War Complete'].iloc[0] != 'Yes':
+            if not df['War Complete'].iat[0]:
                 continue
             
             if 'Is Missed' not in df.columns:
-                df['Is Missed'] = df.apply(
-                    lambda row: 'Yes' if (row.get('Stars', 0) == 0 and row.get('Destruction %', 0) == 0 and row.get('Attack Number', 0) > 0) else 'No',
-                    axis=1
-                )
+                df = df.copy()
+                df['Is Missed'] = derive_is_missed(df)
             
-            if cutoff_date and 'War End Time' in df.columns:
-                df['War End Time'] = pd.to_datetime(df['War End Time'], utc=True)
-                df = df[df['War End Time'] >= cutoff_date]
-            
-            if not df.empty:
-                all_data.append(df)
+            completed.append(df.reindex(columns=LEADERBOARD_COLUMNS))
         except Exception as e:
             print(f"Error processing sheet {sheet_name}: {e}")
             continue
     
-    book.close()
+    if not completed:
+        completed.append(pd.DataFrame(columns=LEADERBOARD_COLUMNS))
+    
+    # Typed columns and masks are computed once here and shared by every leaderboard window
+    all_attacks_df = pd.concat(completed, ignore_index=True)
+    all_attacks_df[FLAG_COLUMNS] = all_attacks_df[FLAG_COLUMNS].fillna(False).astype(bool)
+    all_attacks_df['War End Time'] = pd.to_datetime(
+        all_attacks_df['War End Time'], format=API_TIME_FORMAT, utc=True, errors='coerce'
+    )
+    all_attacks_df['Is Valid Attack'] = ~all_attacks_df['Is Loot Hit'] & ~all_attacks_df['Is Missed']
+    return all_attacks_df
+
+def calculate_leaderboard(all_attacks_df, days_filter=None):
+    """Calculate leaderboard statistics from the combined completed wars"""
+    if days_filter:
+        from datetime import timedelta, timezone
+        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_filter)
+        all_attacks_df = all_attacks_df[all_attacks_df['War End Time'] >= cutoff_date]
     
-    if not all_data:
+    if all_attacks_df.empty:
         print("No completed war data found matching the filter")
         return None
     
-    # Combine all data BEFORE filtering
-    all_attacks_df = pd.concat(all_data, ignore_index=True)
-    
     # Get all players who participated in wars (from roster, not just attacks)
     all_war_participants_full = all_attacks_df[['Player Name', 'Player Tag', 'War ID']].drop_duplicates()
     war_participation = all_war_participants_full.groupby(['Player Name', 'Player Tag']).agg({
@@ -428,37 +752,23 @@ def calculate_leaderboard(days_filter=None):
     }).reset_index()
     war_participation.columns = ['Player Name', 'Player Tag', 'Total Wars']
     
-    # Calculate missed hits: count rows where Is Missed = Yes OR Attack Number = 0 (no attacks at all)
-    missed_attacks = all_attacks_df[
-        (all_attacks_df['Is Missed'] == 'Yes') | (all_attacks_df['Attack Number'] == 0)
-    ].copy()
-    
-    # Calculate missed hits: Now simply count where Is Missed = Yes
-    missed_stats = all_attacks_df[all_attacks_df['Is Missed'] == 'Yes'].groupby(['Player Name', 'Player Tag']).size().reset_index(name='Missed Hits')
+    # Calculate missed hits: count rows where Is Missed = Yes
+    missed_stats = all_attacks_df[all_attacks_df['Is Missed']].groupby(['Player Name', 'Player Tag']).size().reset_index(name='Missed Hits')
     
     # Now filter for valid attacks (exclude loot and missed)
-    combined_df = all_attacks_df[(all_attacks_df['Is Loot Hit'] != 'Yes') & (all_attacks_df['Is Missed'] != 'Yes')]
+    combined_df = all_attacks_df[all_attacks_df['Is Valid Attack']]
     
     if combined_df.empty:
         print("No valid attack data found after filtering")
         return None
     
-    # Get all players who participated (including those who didn't attack)
-    all_war_participants = combined_df[['Player Name', 'Player Tag', 'War ID']].drop_duplicates()
-    
-    # Merge with full war participation to include people who didn't attack at all
-    all_war_participants = war_participation.copy()
-    
     # Calculate attack statistics (only for players who attacked - excluding missed and loot)
-    attack_stats = combined_df.groupby(['Player Name', 'Player Tag']).agg({
-        'Stars': 'sum',
-        'Is Triple': lambda x: (x == 'Yes').sum(),
-        'Attack Number': 'count'
+    attack_stats = combined_df.groupby(['Player Name', 'Player Tag']).agg(**{
+        'Total Stars': ('Stars', 'sum'),
+        'Three Stars': ('Is Triple', 'sum'),
+        'Total Attacks': ('Attack Number', 'count')
     }).reset_index()
     
-    attack_stats.columns = ['Player Name', 'Player Tag', 'Total Stars', 
-                           'Three Stars', 'Total Attacks']
-    
     # Merge with war participation (which includes everyone in the war)
     player_stats = war_participation.merge(
         attack_stats, 
@@ -470,17 +780,13 @@ def calculate_leaderboard(days_filter=None):
     player_stats['Three Stars'] = player_stats['Three Stars'].fillna(0).astype(int)
     player_stats['Total Attacks'] = player_stats['Total Attacks'].fillna(0).astype(int)
     
-    player_stats['3 Star Rate'] = player_stats.apply(
-        lambda row: f"{(row['Three Stars'] / row['Total Attacks'] * 100):.1f}%" 
-        if row['Total Attacks'] > 0 else "0.0%",
-        axis=1
-    )
+    # Players with no valid attacks get NaN rates, reported as zero
+    total_attacks = player_stats['Total Attacks'].replace(0, np.nan)
     
-    player_stats['Avg Stars Per Attack'] = player_stats.apply(
-        lambda row: round(row['Total Stars'] / row['Total Attacks'], 2)
-        if row['Total Attacks'] > 0 else 0.0,
-        axis=1
-    )
+    three_star_rate = (player_stats['Three Stars'] / total_attacks * 100).fillna(0)
+    player_stats['3 Star Rate'] = three_star_rate.map('{:.1f}%'.format)
+    
+    player_stats['Avg Stars Per Attack'] = (player_stats['Total Stars'] / total_attacks).round(2).fillna(0.0)
     
     print(f"\nDebug - Sample calculations:")
     if not player_stats.empty:
@@ -529,8 +835,7 @@ def save_leaderboard_json(leaderboard_data, filename=LEADERBOARD_FILE):
         'players': leaderboard_list
     }
     
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    write_json(filename, data)
     
     print(f"✓ Saved leaderboard to {filename}")
 
@@ -554,14 +859,14 @@ def send_discord_war_report(war_data, war):
         result = "🏆 VICTORY!" if clan_stars > opponent_stars else ("💔 DEFEAT" if clan_stars < opponent_stars else "🤝 TIE")
         color = 0x10b981 if clan_stars > opponent_stars else (0xef4444 if clan_stars < opponent_stars else 0xf59e0b)
         
-        df = pd.DataFrame(war_data['war_details'])
+        df = war_data['war_details']
         df = df[df['Attack Number'] > 0]
         
         top_stars = df.nlargest(3, 'Stars')[['Player Name', 'Stars', 'Destruction %']]
         top_performers = "\n".join([f"⭐ **{row['Player Name']}**: {row['Stars']}⭐ ({row['Destruction %']:.1f}%)" 
                                     for _, row in top_stars.iterrows()])
         
-        missed_df = df[df['Is Missed'] == 'Yes']
+        missed_df = df[df['Is Missed']]
         missed_count = len(missed_df)
         
         embed = {
@@ -595,7 +900,7 @@ def send_discord_war_report(war_data, war):
             "embeds": [embed]
         }
         
-        response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
+        response = SESSION.post(DISCORD_WEBHOOK_URL, json=payload)
         response.raise_for_status()
         print("✓ Sent war report to Discord")
         
@@ -620,6 +925,14 @@ def main():
     state = war.get('state', 'notInWar')
     print(f"War State: {state}")
     
+    # Sheets are loaded once and shared by the Excel writer and every leaderboard
+    war_sheets = load_all_war_sheets()
+    
+    # Saving or republishing from a partial set of wars would erase the missing ones
+    if war_sheets is None:
+        print("Failed to load saved wars - fix the errors above before running again")
+        return
+    
     if state == 'notInWar':
         print("Clan is not currently in war")
     else:
@@ -629,7 +942,7 @@ def main():
             war_id = get_war_id(war)
             print(f"War ID: {war_id}")
             
-            war_data = process_war(war)
+            war_data = process_war(war, war_sheets=war_sheets)
             
             if war_data:
                 war_id = war_data['war_id']
@@ -640,22 +953,25 @@ def main():
                     print(f"War {war_id} is already complete - skipping update")
                 elif war_data['is_ended']:
                     print("War has ENDED - saving complete war data...")
-                    save_war_to_excel(war_data)
-                    update_roster_sheet()
-                    update_missed_hits_sheet()
+                    save_war_to_excel(war_data, war_sheets)
                     send_discord_war_report(war_data, war)
                 else:
                     print("War is IN PROGRESS - saving current state...")
-                    save_war_to_excel(war_data)
-                    update_roster_sheet()
-                    update_missed_hits_sheet()
+                    save_war_to_excel(war_data, war_sheets)
             else:
                 print("Error processing war data")
     
+    # A deleted workbook is rebuilt from the loaded wars even when no war was saved this run
+    if war_sheets and not os.path.exists(EXCEL_FILE):
+        publish_workbook(war_sheets)
+    
     print("\n" + "="*60)
     print("UPDATING LEADERBOARDS (Completed Wars Only)")
     print("="*60)
     
+    # Completed wars are combined once and shared by every leaderboard window
+    all_attacks_df = combine_completed_wars(war_sheets)
+    
     periods = [
         (None, 'All Time'),
         (7, 'Last 7 Days'),
@@ -665,7 +981,7 @@ def main():
     
     for days, label in periods:
         print(f"\n{label}:")
-        leaderboard = calculate_leaderboard(days)
+        leaderboard = calculate_leaderboard(all_attacks_df, days)
         
         if leaderboard is not None and not leaderboard.empty:
             suffix = f"_{days}d" if days else "_all"